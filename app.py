@@ -13,16 +13,48 @@ Use only for content you own or have explicit permission to download.
 """
 
 import os
-import uuid
+import re
+import shutil
+import secrets
 import time
 import threading
+from types import MappingProxyType
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from urllib.parse import urlparse, parse_qs
+from urllib.parse import urlparse, parse_qs, quote
 
-from flask import Flask, request, jsonify, send_file, send_from_directory, make_response
+import orjson
+from flask import Flask, Response, request, jsonify, send_file, send_from_directory, make_response
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.utils import send_file as wz_send_file
 from yt_dlp import YoutubeDL
 
+# Sorted keys like Flask's default provider; datetimes go through default() (HTTP dates, as in Flask)
+ORJSON_OPTIONS = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson (used by jsonify and request.get_json).
+
+    Differs from DefaultJSONProvider: output is always compact with sorted keys (dumps/loads
+    kwargs such as indent, separators or sort_keys are ignored) and non-ASCII text is written
+    as UTF-8 instead of \\u escapes.
+    """
+
+    def dumps(self, obj, **kwargs) -> str:
+        return orjson.dumps(obj, default=self.default, option=ORJSON_OPTIONS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs) -> Response:
+        # Encode straight to bytes instead of str -> bytes
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=self.default, option=ORJSON_OPTIONS)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
 app = Flask(__name__, static_folder=".", static_url_path="")
+app.json = OrjsonProvider(app)
 
 # Where to save files
 DOWNLOAD_DIR = Path("downloads")
@@ -31,22 +63,54 @@ DOWNLOAD_DIR.mkdir(parents=True, exist_ok=True)
 # Optional: set env FFMPEG_BIN or FFMPEG_DIR to your ffmpeg bin path if ffmpeg isn't on PATH
 FFMPEG_PATH = os.environ.get("FFMPEG_BIN") or os.environ.get("FFMPEG_DIR")
 
-# In-memory job store
+# Optional: set env USE_ARIA2C=1 to fetch single-file HTTP(S) media with aria2c
+# (parallel Range requests, 8 x 8 MiB). HLS/DASH keep yt-dlp's native fragment downloader.
+# Note: yt-dlp reports no byte progress for external downloaders.
+ARIA2C_PATH = shutil.which("aria2c") if os.environ.get("USE_ARIA2C", "").lower() in {"1", "true", "yes"} else None
+ARIA2C_ARGS = ["-x", "8", "-s", "8", "-k", "8M"]
+
+# Optional: let a front-end webserver send finished files.
+#   SENDFILE_HEADER=X-Accel-Redirect (nginx) -> internal location ACCEL_REDIRECT_PREFIX + filename
+#   SENDFILE_HEADER=X-Sendfile (apache/lighttpd) -> absolute file path
+SENDFILE_HEADER = (os.environ.get("SENDFILE_HEADER") or "").strip().lower()
+ACCEL_REDIRECT_PREFIX = os.environ.get("ACCEL_REDIRECT_PREFIX", "/_downloads/")
+
+# In-memory job store. Each job dict carries its own "lock" serializing writers;
+# jobs_lock only guards inserting new entries. Readers (lookups and field reads) take
+# no lock: single dict operations are atomic under the GIL.
 jobs: dict[str, dict] = {}
 jobs_lock = threading.Lock()
 
+# Shared worker pool for yt-dlp jobs; extra submissions wait in the executor queue
+MAX_JOBS = max(1, int(os.environ.get("MAX_JOBS", 4)))
+EXECUTOR = ThreadPoolExecutor(max_workers=MAX_JOBS, thread_name_prefix="dl")
+# On shutdown drop queued jobs instead of running them all before exit (running ones still finish).
+# Must run before concurrent.futures joins its workers, which happens ahead of atexit handlers.
+threading._register_atexit(EXECUTOR.shutdown, wait=False, cancel_futures=True)
+
+# Minimum seconds between published progress updates per job
+PROGRESS_INTERVAL = 0.15
+
+# Parallel fragment downloads for HLS/DASH (client may override via "concurrentFragments")
+DEFAULT_CONCURRENT_FRAGMENTS = 5
+MAX_CONCURRENT_FRAGMENTS = 16
+# Hosts known to rate-limit/ban parallel fragment fetches; these stay at 1 (comma-separated)
+SINGLE_FRAGMENT_HOSTS = {
+    h.strip().lower() for h in (os.environ.get("SINGLE_FRAGMENT_HOSTS") or "").split(",") if h.strip()
+}
+
 # UA presets (match your UI)
-UA_PRESETS = {
+UA_PRESETS = MappingProxyType({
     "chrome_win": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36",
     "firefox_linux": "Mozilla/5.0 (X11; Linux x86_64; rv:125.0) Gecko/20100101 Firefox/125.0",
     "safari_mac": "Mozilla/5.0 (Macintosh; Intel Mac OS X 13_5) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.5 Safari/605.1.15",
     "chrome_android": "Mozilla/5.0 (Linux; Android 13; SM-S911B) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Mobile Safari/537.36",
     "safari_ios": "Mozilla/5.0 (iPhone; CPU iPhone OS 17_4 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.4 Mobile/15E148 Safari/604.1",
-}
+})
 DEFAULT_UA = UA_PRESETS["chrome_win"]
 
 # Resolution → yt-dlp format
-FORMAT_MAP = {
+FORMAT_MAP = MappingProxyType({
     "1": "bv*[height<=4320]+ba/b[height<=4320]",
     "2": "bv*[height<=2160]+ba/b[height<=2160]",
     "3": "bv*[height<=1440]+ba/b[height<=1440]",
@@ -57,39 +121,77 @@ FORMAT_MAP = {
     "8": "bv*[height<=240]+ba/b[height<=240]",
     "9": "bv*[height<=144]+ba/b[height<=144]",
     "10": "ba/b",  # audio only
-}
-
+})
+
+def status_json(job: dict) -> bytes:
+    """Serialize the /api/status body for a job."""
+    return orjson.dumps({
+        "id": job["id"],
+        "state": job["state"],
+        "progress": job.get("progress"),
+        "eta": job.get("eta"),
+        "speed": job.get("speed"),
+        "ready": job.get("ready", False),
+        "error": job.get("error"),
+    }, option=ORJSON_OPTIONS)
+
+def publish(job: dict, fields: dict) -> None:
+    """Apply status fields to a job and refresh its cached status body."""
+    job.update(fields)
+    job["status_json"] = status_json(job)
+
+# Pre-encoded error bodies for the status/file endpoints
+ERR_JOB_NOT_FOUND = orjson.dumps({"error": "job not found"})
+ERR_FILE_NOT_READY = orjson.dumps({"error": "file not ready"})
+ERR_FILE_MISSING = orjson.dumps({"error": "file missing"})
+
+def json_error(body: bytes, status: int) -> Response:
+    """Wrap a pre-encoded JSON error body in a response."""
+    return Response(body, status, mimetype="application/json")
+
+# Split into netloc, path and query in one linear pass (no overlapping repeats to backtrack over);
+# the host test is a plain substring check in Python, as with urlparse before.
+# Like urlparse, any scheme (or a scheme-relative "//host") is accepted.
+_URL_PARTS = re.compile(r"^(?:[A-Za-z][A-Za-z0-9+.-]*:)?//([^/?#]*)([^?#]*)(?:\?([^#]*))?")
+_YT_ID = re.compile(r"[A-Za-z0-9_-]+")
+# youtu.be/<id>, youtube.com/shorts/<id> on the path; ids must end at "/" or the end of the path,
+# so malformed ids (e.g. "abc.def") leave the URL unchanged instead of being truncated
+_YT_SHORT = re.compile(r"/+([A-Za-z0-9_-]+)(?=/|$)")
+_YT_SHORTS = re.compile(r"/shorts/([A-Za-z0-9_-]+)(?=/|$)")
+# First non-empty v= wins, as with parse_qs(...)["v"][0]; the value is checked against _YT_ID
+_YT_WATCH = re.compile(r"(?:^|&)v=([^&]+)")
+
+@lru_cache(maxsize=1024)
 def normalize_youtube_url(u: str) -> str:
     """Convert youtu.be and shorts URLs to standard watch?v=... form when possible."""
-    try:
-        p = urlparse(u)
-        host = (p.netloc or "").lower()
-        path = p.path or ""
-        if "youtu.be" in host:
-            vid = path.strip("/").split("/")[0]
-            if vid:
+    parts = _URL_PARTS.match(u)
+    if not parts:
+        return u
+    host, path, query = parts.group(1).lower(), parts.group(2), parts.group(3) or ""
+    m = None
+    if "youtu.be" in host:
+        m = _YT_SHORT.match(path)
+    if not m and "youtube.com" in host:
+        m = _YT_SHORTS.match(path)
+        if not m and path.startswith("/watch"):
+            if "%" in query or "+" in query:
+                # Percent-encoded or "+" query: decode like before
+                vid = (parse_qs(query).get("v") or [""])[0]
+            else:
+                w = _YT_WATCH.search(query)
+                vid = w.group(1) if w else ""
+            if _YT_ID.fullmatch(vid):
                 return f"https://www.youtube.com/watch?v={vid}"
-        if "youtube.com" in host:
-            # shorts -> watch
-            if path.startswith("/shorts/"):
-                parts = path.strip("/").split("/")
-                vid = parts[1] if len(parts) > 1 else ""
-                if vid:
-                    return f"https://www.youtube.com/watch?v={vid}"
-            # keep only v param for watch URLs
-            if path.startswith("/watch"):
-                qs = parse_qs(p.query)
-                if "v" in qs and qs["v"]:
-                    return f"https://www.youtube.com/watch?v={qs['v'][0]}"
-    except Exception:
-        pass
+    if m:
+        return f"https://www.youtube.com/watch?v={m.group(1)}"
     return u
 
+DEFAULT_OUTTMPL = str(DOWNLOAD_DIR / "%(title).200B [%(id)s].%(ext)s")
+
 def build_outtmpl(filename_choice: str, filename_custom: str) -> str:
     """Build output template path based on Auto/Custom choice."""
-    default_tpl = str(DOWNLOAD_DIR / "%(title).200B [%(id)s].%(ext)s")
     if filename_choice != "custom" or not (filename_custom or "").strip():
-        return default_tpl
+        return DEFAULT_OUTTMPL
 
     name = filename_custom.strip()
     # If looks like a yt-dlp template, use as-is
@@ -105,16 +207,29 @@ def find_final_file(video_id: str) -> Path | None:
     """Try to find the final file by [id] pattern in downloads folder."""
     if not video_id:
         return None
-    matches = list(DOWNLOAD_DIR.glob(f"*[{video_id}].*"))
-    if not matches:
-        return None
-    return max(matches, key=lambda p: p.stat().st_mtime)
+    # Plain substring match in one scandir pass (glob would treat "[id]" as a character class)
+    marker = f"[{video_id}]."
+    best, best_mtime = None, -1.0
+    with os.scandir(DOWNLOAD_DIR) as it:
+        for entry in it:
+            if marker not in entry.name or not entry.is_file():
+                continue
+            mtime = entry.stat().st_mtime
+            if mtime > best_mtime:
+                best, best_mtime = entry.path, mtime
+    return Path(best) if best else None
 
 def resolve_final_file(info: dict, job: dict, selection: str, audio_fmt: str, merge: str) -> Path | None:
     """Robustly resolve the final output file path after yt-dlp finishes."""
     video_id = job.get("video_id") or (info.get("id") if isinstance(info, dict) else None)
     start_ts = job.get("start_ts", 0.0)
 
+    # 0) Final path reported by yt-dlp (after merge/postprocessing), then by the postprocessor hook
+    downloads = info.get("requested_downloads") if isinstance(info, dict) else None
+    for fp in ((downloads[-1] or {}).get("filepath") if downloads else None, job.get("pp_filename")):
+        if fp and os.path.isfile(fp):
+            return Path(fp)
+
     # 1) By [id] pattern
     p = find_final_file(video_id)
     if p and p.exists():
@@ -150,26 +265,71 @@ def resolve_final_file(info: dict, job: dict, selection: str, audio_fmt: str, me
                 if ext:
                     candidates.append(DOWNLOAD_DIR / f"{stem}.{ext}")
 
-    # Test candidates
-    for c in candidates:
+    # Test candidates (deduplicated, order kept; one stat each)
+    for c in dict.fromkeys(candidates):
         try:
-            if c and Path(c).exists():
-                return Path(c)
-        except Exception:
+            os.stat(c)
+        except (OSError, ValueError):
             continue
+        return c
 
     # 4) Fallback: newest file created/modified after the job started (allow small skew)
     try:
-        recent = sorted(DOWNLOAD_DIR.glob("*"), key=lambda q: q.stat().st_mtime, reverse=True)
-        for q in recent:
-            if q.stat().st_mtime >= (start_ts - 5):
-                return q
+        cutoff = start_ts - 5
+        newest, newest_mtime = None, cutoff
+        # DirEntry caches stat results; one pass, no sort
+        with os.scandir(DOWNLOAD_DIR) as it:
+            for entry in it:
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                mtime = entry.stat(follow_symlinks=False).st_mtime
+                if mtime >= newest_mtime:
+                    newest, newest_mtime = entry.path, mtime
+        if newest:
+            return Path(newest)
     except Exception:
         pass
 
     return None
 
+@lru_cache(maxsize=1)
+def default_extractors() -> tuple:
+    """yt-dlp's default extractor list, resolved once instead of on every YoutubeDL()."""
+    # Deliberately reads the private YoutubeDL._ies; empty if a yt-dlp release drops it
+    with YoutubeDL({"quiet": True}) as ydl:
+        ies = getattr(ydl, "_ies", None)
+        return tuple(ies.values()) if isinstance(ies, dict) else ()
+
+def new_youtube_dl(opts: dict) -> YoutubeDL:
+    """Create a per-job YoutubeDL, registering the cached default extractors."""
+    ies = default_extractors()
+    # Stock constructor when the cache is unavailable or extractors are filtered per job
+    if not ies or "allowed_extractors" in opts:
+        return YoutubeDL(opts)
+    ydl = YoutubeDL(opts, auto_init=False)
+    for ie in ies:
+        # classes can be shared; extractor instances hold a downloader ref, so never share those
+        ydl.add_info_extractor(ie if isinstance(ie, type) else type(ie)())
+    return ydl
+
+def concurrent_fragments_for(url: str, requested) -> int:
+    """Number of parallel fragment downloads for this URL (clamped to 1 for SINGLE_FRAGMENT_HOSTS)."""
+    try:
+        host = (urlparse(url).hostname or "").lower()
+    except ValueError:
+        host = ""  # malformed URL; let yt-dlp report it inside run_download's try
+    if any(host == h or host.endswith("." + h) for h in SINGLE_FRAGMENT_HOSTS):
+        return 1
+    try:
+        n = int(requested)
+    except (TypeError, ValueError):
+        n = DEFAULT_CONCURRENT_FRAGMENTS
+    return max(1, min(n, MAX_CONCURRENT_FRAGMENTS))
+
 def run_download(job_id: str, payload: dict):
+    job = jobs[job_id]
+    job_lock = job["lock"]
+
     # 1) Read payload + normalize URL (helps avoid 403 for youtu.be/shorts)
     url_raw = (payload.get("url") or "").strip()
     url = normalize_youtube_url(url_raw)
@@ -182,6 +342,7 @@ def run_download(job_id: str, payload: dict):
     filename_choice = payload.get("filenameChoice", "")
     filename_custom = payload.get("filenameCustom", "")
     cookies_from = (payload.get("cookiesFrom") or "").strip().lower()
+    fragments = payload.get("concurrentFragments", DEFAULT_CONCURRENT_FRAGMENTS)
 
     fmt = FORMAT_MAP.get(selection, FORMAT_MAP["4"])
     outtmpl = build_outtmpl(filename_choice, filename_custom)
@@ -196,11 +357,20 @@ def run_download(job_id: str, payload: dict):
         "retries": 10,
         "fragment_retries": 10,
         "socket_timeout": 30,
+        # Large sequential I/O: 64 KiB write buffer, 10 MiB HTTP chunks
+        "buffersize": 64 * 1024,
+        "http_chunk_size": 10 * 1024 * 1024,
+        # Fetch HLS/DASH fragments in parallel
+        "concurrent_fragment_downloads": concurrent_fragments_for(url, fragments),
     }
 
     if FFMPEG_PATH:
         ydl_opts["ffmpeg_location"] = FFMPEG_PATH
 
+    if ARIA2C_PATH:
+        ydl_opts["external_downloader"] = {"http": ARIA2C_PATH}
+        ydl_opts["external_downloader_args"] = {"aria2c": ARIA2C_ARGS}
+
     # Headers and UA
     ydl_opts["http_headers"] = {}
     if ua_choice == "custom" and ua_custom:
@@ -231,7 +401,6 @@ def run_download(job_id: str, payload: dict):
         ydl_opts["http_headers"].setdefault("Referer", "https://www.youtube.com")
         ydl_opts.setdefault("extractor_args", {})
         ydl_opts["extractor_args"]["youtube"] = {"player_client": ["android", "web"]}
-        ydl_opts["concurrent_fragment_downloads"] = 1
         ydl_opts["geo_bypass"] = True
         cookies_env = (os.environ.get("COOKIES_BROWSER") or "").strip().lower()
         pick_cookies = cookies_from or cookies_env
@@ -239,34 +408,53 @@ def run_download(job_id: str, payload: dict):
             ydl_opts["cookiesfrombrowser"] = (pick_cookies,)
 
     # 3) Hooks
+    last_publish = 0.0
+
     def hook(d):
-        with jobs_lock:
-            job = jobs.get(job_id)
-            if not job:
+        nonlocal last_publish
+        status = d.get("status")
+        # Coalesce byte-progress ticks: clients poll ~1/s, yt-dlp reports far more often
+        if status == "downloading":
+            now = time.monotonic()
+            if now - last_publish < PROGRESS_INTERVAL:
                 return
-            status = d.get("status")
-            info = d.get("info_dict") or {}
-            total = d.get("total_bytes") or d.get("total_bytes_estimate") or 0
-            downloaded = d.get("downloaded_bytes", 0)
-            percent = round(downloaded / total * 100, 2) if total else None
-            if info.get("id"):
-                job["video_id"] = info.get("id")
-            # keep track of last known filename (before post-process)
-            if d.get("filename"):
-                job["filename"] = d["filename"]
-
-            if status == "downloading":
-                job.update({
-                    "state": "downloading",
-                    "progress": percent,
-                    "eta": d.get("eta"),
-                    "speed": d.get("speed"),
-                })
-            elif status == "finished":
-                job.update({
-                    "state": "processing",
-                    "progress": 100.0,
-                })
+            last_publish = now
+
+        # Build the update outside the lock; progress ticks are published without locking
+        info = d.get("info_dict") or {}
+        total = d.get("total_bytes") or d.get("total_bytes_estimate") or 0
+        downloaded = d.get("downloaded_bytes", 0)
+        percent = round(downloaded / total * 100, 2) if total else None
+
+        update: dict = {}
+        if info.get("id"):
+            update["video_id"] = info.get("id")
+        # keep track of last known filename (before post-process)
+        if d.get("filename"):
+            update["filename"] = d["filename"]
+
+        if status == "downloading":
+            update.update({
+                "state": "downloading",
+                "progress": percent,
+                "eta": d.get("eta"),
+                "speed": d.get("speed"),
+            })
+        elif status == "finished":
+            update.update({
+                "state": "processing",
+                "progress": 100.0,
+            })
+
+        if not update:
+            return
+        if status == "downloading" and job["state"] == "downloading":
+            # Progress ticks skip the lock. Fragment threads may publish out of order, so a stale
+            # status body can briefly win; it is replaced on the next tick, and the final write is locked.
+            publish(job, update)
+            return
+        with job_lock:
+            publish(job, update)
 
     def pp_hook(d):
         # postprocessor finished -> capture final filepath if present
@@ -274,30 +462,28 @@ def run_download(job_id: str, payload: dict):
             info = d.get("info_dict") or {}
             fp = info.get("filepath") or info.get("_filename") or d.get("filename")
             if fp:
-                with jobs_lock:
-                    job = jobs.get(job_id)
-                    if job is not None:
-                        job["pp_filename"] = fp
+                with job_lock:
+                    job["pp_filename"] = fp
 
     ydl_opts["progress_hooks"].append(hook)
     ydl_opts["postprocessor_hooks"].append(pp_hook)
 
-    with jobs_lock:
-        jobs[job_id].update({"state": "starting", "progress": 0})
+    with job_lock:
+        publish(job, {"state": "starting", "progress": 0})
 
     # 4) Run yt-dlp
     try:
-        with YoutubeDL(ydl_opts) as ydl:
+        with new_youtube_dl(ydl_opts) as ydl:
             info = ydl.extract_info(url, download=True)
 
-        # Decide final output file robustly
-        with jobs_lock:
-            job = jobs.get(job_id, {})
+        # Decide final output file robustly (on a snapshot, so the filesystem scan runs unlocked)
+        with job_lock:
             job["merge_ext"] = (merge if merge and merge != "auto" and selection != "10" else "")
-        final_path = resolve_final_file(info if isinstance(info, dict) else {}, job, selection, audio_fmt, merge)
+            snapshot = dict(job)
+        final_path = resolve_final_file(info if isinstance(info, dict) else {}, snapshot, selection, audio_fmt, merge)
 
-        with jobs_lock:
-            jobs[job_id].update({
+        with job_lock:
+            publish(job, {
                 "state": "finished",
                 "ready": bool(final_path),
                 "file": str(final_path) if final_path else None,
@@ -305,8 +491,8 @@ def run_download(job_id: str, payload: dict):
             })
 
     except Exception as e:
-        with jobs_lock:
-            jobs[job_id].update({
+        with job_lock:
+            publish(job, {
                 "state": "error",
                 "error": str(e),
             })
@@ -324,55 +510,58 @@ def api_download():
     if not url:
         return jsonify({"error": "URL is required"}), 400
 
-    job_id = uuid.uuid4().hex[:12]
+    job_id = secrets.token_hex(6)
+    job = {
+        "id": job_id,
+        "state": "queued",
+        "progress": 0,
+        "ready": False,
+        "file": None,
+        "error": None,
+        "video_id": None,
+        "filename": None,
+        "pp_filename": None,
+        "start_ts": time.time(),
+        "merge_ext": "",
+        "lock": threading.Lock(),
+        "future": None,
+    }
+    job["status_json"] = status_json(job)
     with jobs_lock:
-        jobs[job_id] = {
-            "id": job_id,
-            "state": "queued",
-            "progress": 0,
-            "ready": False,
-            "file": None,
-            "error": None,
-            "video_id": None,
-            "filename": None,
-            "pp_filename": None,
-            "start_ts": time.time(),
-            "merge_ext": "",
-        }
-
-    t = threading.Thread(target=run_download, args=(job_id, data), daemon=True)
-    t.start()
+        jobs[job_id] = job
+
+    job["future"] = EXECUTOR.submit(run_download, job_id, data)
     return jsonify({"job_id": job_id})
 
 @app.get("/api/status/<job_id>")
 def api_status(job_id):
-    with jobs_lock:
-        job = jobs.get(job_id)
-        if not job:
-            return jsonify({"error": "job not found"}), 404
-        return jsonify({
-            "id": job["id"],
-            "state": job["state"],
-            "progress": job.get("progress"),
-            "eta": job.get("eta"),
-            "speed": job.get("speed"),
-            "ready": job.get("ready", False),
-            "error": job.get("error"),
-        })
+    job = jobs.get(job_id)
+    if not job:
+        return json_error(ERR_JOB_NOT_FOUND, 404)
+    # Worker died before it could record a final state (e.g. bad payload)
+    future = job.get("future")
+    if job["state"] not in {"finished", "error"} and future is not None and future.done():
+        exc = None if future.cancelled() else future.exception()
+        return Response(status_json({
+            **job, "state": "error", "error": str(exc) if exc else "job stopped unexpectedly",
+        }), mimetype="application/json")
+    # Pre-serialized by publish(); no lock or re-encoding per poll
+    return Response(job["status_json"], mimetype="application/json")
 
 @app.route("/api/file/<job_id>", methods=["GET", "HEAD"])
 def api_file(job_id):
-    with jobs_lock:
-        job = jobs.get(job_id)
-        if not job:
-            return jsonify({"error": "job not found"}), 404
-        path = job.get("file")
-        if not job.get("ready") or not path:
-            return jsonify({"error": "file not ready"}), 409
+    job = jobs.get(job_id)
+    if not job:
+        return json_error(ERR_JOB_NOT_FOUND, 404)
+    # Unlocked read: "file" and "ready" are set together in one publish(), and a
+    # None path is rejected below even if "ready" was read after the update.
+    path = job.get("file")
+    if not job.get("ready") or not path:
+        return json_error(ERR_FILE_NOT_READY, 409)
 
     p = Path(path)
     if not p.exists():
-        return jsonify({"error": "file missing"}), 410
+        return json_error(ERR_FILE_MISSING, 410)
 
     if request.method == "HEAD":
         # Minimal headers for HEAD checks
@@ -382,7 +571,24 @@ def api_file(job_id):
         resp.headers["Cache-Control"] = "no-store"
         return resp
 
-    resp = send_file(p, as_attachment=True)
+    accel_uri = None
+    if SENDFILE_HEADER == "x-accel-redirect":
+        try:
+            # Keep subdirectories from custom output templates (e.g. "%(uploader)s/...")
+            rel = p.resolve().relative_to(DOWNLOAD_DIR.resolve()).as_posix()
+            accel_uri = ACCEL_REDIRECT_PREFIX + quote(rel)
+        except ValueError:
+            pass  # outside downloads/ (e.g. a "../x.mp4" custom name): not under the nginx location
+
+    if SENDFILE_HEADER == "x-sendfile" or accel_uri:
+        # Headers only; the webserver streams the body (with Range support)
+        resp = wz_send_file(p, request.environ, as_attachment=True, use_x_sendfile=True, conditional=False)
+        if accel_uri:
+            del resp.headers["X-Sendfile"]
+            resp.headers["X-Accel-Redirect"] = accel_uri
+    else:
+        # Werkzeug answers Range requests with 206 Partial Content
+        resp = send_file(p, as_attachment=True, conditional=True)
     resp.headers["Cache-Control"] = "no-store"
     return resp
 
@@ -393,5 +599,7 @@ def healthz():
 # ----------------------------------------------------
 
 if __name__ == "__main__":
+    # Local runs only; production is served by gunicorn (see Dockerfile)
     port = int(os.environ.get("PORT", 5000))
-    app.run(debug=True, port=port)
\ No newline at end of file
+    debug = os.environ.get("FLASK_DEBUG", "").lower() in {"1", "true", "yes"}
+    app.run(debug=debug, port=port, threaded=True)
\ No newline at end of file